@@ -0,0 +1,191 @@
+from collections import OrderedDict
+from threading import Lock
+from PIL import Image, ImageChops, ImageFilter
+
+# ========================
+# Perceptual Hashing
+# ========================
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+THUMBNAIL_SIZE = 32
+
+
+def thumbnail(image, size=THUMBNAIL_SIZE):
+    """
+    Small RGB copy of an upload, used for hashing and match verification
+    - Downscale to (size, size) with a box filter
+
+    reducing_gap lets Pillow shrink by integer factors first, which is much
+    cheaper than a direct resampling pass over the full-size image.
+    """
+    return image.convert('RGB').resize((size, size), Image.BOX, reducing_gap=2.0)
+
+
+def dhash(image, hash_size=HASH_SIZE):
+    """
+    Difference hash (dHash) of a PIL image, normally a thumbnail()
+    - Downscale to (hash_size + 1, hash_size) with a box filter, then grayscale
+    - Each bit records whether a pixel is brighter than its right neighbour
+
+    Recompression and resizing barely move the hash, so visually identical
+    uploads land within a few bits of each other. The hash only sees outline
+    and overall brightness, not small lesions, so matches must be confirmed
+    with thumbnail_difference().
+
+    Returns:
+        int: hash_size * hash_size bit fingerprint
+    """
+    small = image.resize((hash_size + 1, hash_size), Image.BOX).convert('L')
+    pixels = small.tobytes()
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+
+def _excess(reference, other):
+    """How far other's pixels fall outside reference's 3x3 neighbourhood range"""
+    low = reference.filter(ImageFilter.MinFilter(3))
+    high = reference.filter(ImageFilter.MaxFilter(3))
+    outside = ImageChops.lighter(
+        ImageChops.subtract(low, other),
+        ImageChops.subtract(other, high)
+    )
+    return max(band_max for _, band_max in outside.getextrema())
+
+
+def thumbnail_difference(a, b):
+    """
+    Tolerant per-pixel difference between two thumbnails (0-255)
+
+    Each pixel may move anywhere within the range of its 3x3 neighbourhood
+    in the other thumbnail, which absorbs the edge shifts caused by resizing
+    and JPEG recompression. A new lesion inside a flat region of leaf has no
+    such neighbour and shows up as a large difference.
+    """
+    return max(_excess(a, b), _excess(b, a))
+
+
+# ========================
+# Near-Duplicate Index
+# ========================
+
+class PerceptualHashIndex:
+    """
+    Bounded LRU index of previous predictions keyed by perceptual hash
+
+    Lookups return the closest stored result for the same model within
+    max_distance bits whose thumbnail is also within max_pixel_difference of
+    the query thumbnail. The hash is split into max_distance + 1 bands, so by
+    the pigeonhole principle any match shares at least one band exactly;
+    only entries in those band buckets are compared, not the whole index.
+    """
+    def __init__(self, max_entries=1024, max_distance=4, max_pixel_difference=10,
+                 hash_bits=HASH_BITS):
+        if not 0 <= max_distance < hash_bits:
+            raise ValueError(f"max_distance must be between 0 and {hash_bits - 1}")
+        if not 0 <= max_pixel_difference <= 255:
+            raise ValueError("max_pixel_difference must be between 0 and 255")
+
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_pixel_difference = max_pixel_difference
+        self.hits = 0
+        self.misses = 0
+
+        # Split the hash into max_distance + 1 near-equal (shift, mask) bands
+        num_bands = max_distance + 1
+        self._bands = []
+        shift = 0
+        for i in range(num_bands):
+            width = hash_bits // num_bands + (1 if i < hash_bits % num_bands else 0)
+            self._bands.append((shift, (1 << width) - 1))
+            shift += width
+
+        self._entries = OrderedDict()  # (model_name, hash) -> (thumbnail, result)
+        self._buckets = {}             # (model_name, band, band_value) -> set of hashes
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        """False when max_entries <= 0, i.e. caching is turned off"""
+        return self.max_entries > 0
+
+    def _band_keys(self, model_name, image_hash):
+        return [
+            (model_name, i, (image_hash >> shift) & mask)
+            for i, (shift, mask) in enumerate(self._bands)
+        ]
+
+    def lookup(self, model_name, image_hash, image_thumbnail):
+        """Return the nearest verified cached result for model_name, or None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            candidates = {}
+            for key in self._band_keys(model_name, image_hash):
+                for candidate in self._buckets.get(key, ()):
+                    distance = hamming_distance(image_hash, candidate)
+                    if distance <= self.max_distance:
+                        candidates[candidate] = distance
+
+            for candidate in sorted(candidates, key=candidates.get):
+                entry_key = (model_name, candidate)
+                stored_thumbnail, result = self._entries[entry_key]
+                difference = thumbnail_difference(image_thumbnail, stored_thumbnail)
+                if difference <= self.max_pixel_difference:
+                    self.hits += 1
+                    self._entries.move_to_end(entry_key)
+                    return result
+
+            self.misses += 1
+            return None
+
+    def add(self, model_name, image_hash, image_thumbnail, result):
+        """Store a prediction, evicting the least recently used entry when full"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            entry_key = (model_name, image_hash)
+            if entry_key in self._entries:
+                self._entries[entry_key] = (image_thumbnail, result)
+                self._entries.move_to_end(entry_key)
+                return
+
+            self._entries[entry_key] = (image_thumbnail, result)
+            for key in self._band_keys(model_name, image_hash):
+                self._buckets.setdefault(key, set()).add(image_hash)
+
+            while len(self._entries) > self.max_entries:
+                (old_model, old_hash), _ = self._entries.popitem(last=False)
+                for key in self._band_keys(old_model, old_hash):
+                    bucket = self._buckets[key]
+                    bucket.discard(old_hash)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def stats(self):
+        """Index size, configuration and hit rate"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "max_distance": self.max_distance,
+                "max_pixel_difference": self.max_pixel_difference,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
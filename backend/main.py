@@ -10,6 +10,7 @@ from model_utils import (
     predict_classification, predict_segmentation,
     DISEASE_CLASSES, get_disease_suggestion
 )
+from image_cache import PerceptualHashIndex, dhash, thumbnail, HASH_BITS
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -38,6 +39,46 @@ MODEL_PATHS = {
     'U-Net': 'models/unet_model.h5'
 }
 
+# Near-duplicate prediction cache defaults (set PHASH_CACHE_SIZE=0 to disable)
+PHASH_CACHE_SIZE = 1024
+PHASH_MAX_DISTANCE = 4
+PHASH_MAX_PIXEL_DIFFERENCE = 10
+
+
+def read_cache_setting(name, default, minimum, maximum=None):
+    """Read an integer cache setting from the environment, falling back to its default"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        setting = int(value)
+    except ValueError:
+        setting = None
+    if setting is None or setting < minimum or (maximum is not None and setting > maximum):
+        expected = f"between {minimum} and {maximum}" if maximum is not None else f">= {minimum}"
+        print(f"Warning: Invalid {name}={value!r}, expected an integer {expected}")
+        print(f"Using default {name}={default}")
+        return default
+    return setting
+
+
+def create_prediction_cache():
+    """Build the prediction cache from environment variables"""
+    return PerceptualHashIndex(
+        max_entries=read_cache_setting(
+            'PHASH_CACHE_SIZE', PHASH_CACHE_SIZE, 0
+        ),
+        max_distance=read_cache_setting(
+            'PHASH_MAX_DISTANCE', PHASH_MAX_DISTANCE, 0, HASH_BITS - 1
+        ),
+        max_pixel_difference=read_cache_setting(
+            'PHASH_MAX_PIXEL_DIFFERENCE', PHASH_MAX_PIXEL_DIFFERENCE, 0, 255
+        )
+    )
+
+
+prediction_cache = create_prediction_cache()
+
 
 @app.on_event("startup")
 async def load_models():
@@ -89,6 +130,7 @@ async def root():
         "endpoints": {
             "/predict": "POST - Predict disease from leaf image",
             "/models": "GET - List available models",
+            "/cache": "GET - Near-duplicate prediction cache statistics",
             "/health": "GET - Check API health"
         }
     }
@@ -118,6 +160,12 @@ async def list_models():
     }
 
 
+@app.get("/cache")
+async def cache_stats():
+    """Near-duplicate prediction cache statistics"""
+    return prediction_cache.stats()
+
+
 @app.post("/predict")
 async def predict_disease(
     file: UploadFile = File(...),
@@ -161,6 +209,16 @@ async def predict_disease(
         image_data = await file.read()
         image = Image.open(io.BytesIO(image_data)).convert('RGB')
         
+        # Reuse the prediction for a visually identical earlier upload.
+        # U-Net is excluded: its mask is rendered at this upload's size.
+        image_hash = None
+        if prediction_cache.enabled and model_name != 'U-Net':
+            image_thumbnail = thumbnail(image)
+            image_hash = dhash(image_thumbnail)
+            cached = prediction_cache.lookup(model_name, image_hash, image_thumbnail)
+            if cached is not None:
+                return JSONResponse(cached)
+        
         # Process based on model type
         if model_name == 'U-Net':
             # Segmentation
@@ -200,13 +258,16 @@ async def predict_disease(
             # Get treatment suggestion
             suggestion = get_disease_suggestion(class_name)
             
-            return JSONResponse({
+            result = {
                 "model": model_name,
                 "type": "classification",
                 "class": class_name,
                 "confidence": confidence,
                 "suggestion": suggestion
-            })
+            }
+            if image_hash is not None:
+                prediction_cache.add(model_name, image_hash, image_thumbnail, result)
+            return JSONResponse(result)
     
     except Exception as e:
         raise HTTPException(
@@ -62,6 +62,22 @@ def test_health():
         print("✗ Could not connect to backend server")
         print("Make sure the backend is running on http://localhost:8000")
 
+def test_cache():
+    """Test the /cache endpoint"""
+    try:
+        response = requests.get("http://localhost:8000/cache")
+        if response.status_code == 200:
+            result = response.json()
+            print("\nPrediction cache:")
+            print(f"Entries: {result['entries']}/{result['max_entries']}")
+            print(f"Hits: {result['hits']}, Misses: {result['misses']}")
+            print(f"Hit rate: {result['hit_rate'] * 100:.2f}%")
+        else:
+            print(f"✗ Cache check failed: {response.status_code}")
+    except requests.exceptions.ConnectionError:
+        print("✗ Could not connect to backend server")
+        print("Make sure the backend is running on http://localhost:8000")
+
 if __name__ == "__main__":
     # Test health first
     test_health()
@@ -71,6 +87,7 @@ if __name__ == "__main__":
         image_path = sys.argv[1]
         model_name = sys.argv[2] if len(sys.argv) > 2 else "CNN"
         test_predict(image_path, model_name)
+        test_cache()
     else:
         print("\nUsage: python test_api.py <image_path> [model_name]")
         print("Example: python test_api.py ../sources/sample1.jpg CNN")
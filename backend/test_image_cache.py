@@ -0,0 +1,220 @@
+"""
+Self-checking tests for the near-duplicate prediction cache
+Run with: python test_image_cache.py
+"""
+import io
+import random
+from PIL import Image, ImageDraw
+from image_cache import (
+    dhash, hamming_distance, thumbnail, thumbnail_difference,
+    PerceptualHashIndex, HASH_BITS
+)
+
+# Shared thumbnail for index tests that only exercise the hash buckets
+BLANK = Image.new('RGB', (32, 32), (60, 140, 50))
+
+
+def flip_bits(value, count, rng):
+    """Flip `count` distinct random bits of a hash"""
+    for bit in rng.sample(range(HASH_BITS), count):
+        value ^= 1 << bit
+    return value
+
+
+def make_leaf_image(lesions=0, size=(640, 480), seed=0):
+    """Synthetic green leaf on a pale background, optionally with brown lesions"""
+    image = Image.new('RGB', size, (235, 235, 230))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((80, 60, 560, 420), fill=(60, 140, 50))
+    draw.line((100, 240, 540, 240), fill=(90, 170, 70), width=4)
+
+    rng = random.Random(seed)
+    for _ in range(lesions):
+        x, y, r = rng.randint(160, 480), rng.randint(120, 360), rng.randint(6, 14)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=(120, 80, 40))
+    return image
+
+
+def recompress(image, size, quality):
+    """Resize and JPEG-recompress an image like a messaging app would"""
+    buffered = io.BytesIO()
+    image.resize(size, Image.LANCZOS).save(buffered, format="JPEG", quality=quality)
+    return Image.open(buffered).convert('RGB')
+
+
+def cached_index(image, result='cached', **kwargs):
+    """Index holding a single CNN prediction for image"""
+    index = PerceptualHashIndex(**kwargs)
+    small = thumbnail(image)
+    index.add('CNN', dhash(small), small, result)
+    return index
+
+
+def lookup_image(index, image):
+    """Look up the CNN prediction for image"""
+    small = thumbnail(image)
+    return index.lookup('CNN', dhash(small), small)
+
+
+def test_dhash_near_duplicates():
+    """Resized and recompressed copies hash close; different images do not"""
+    image = make_leaf_image()
+    image_hash = dhash(thumbnail(image))
+    assert 0 <= image_hash < 1 << HASH_BITS
+
+    recompressed = recompress(image, (320, 240), 40)
+    assert hamming_distance(image_hash, dhash(thumbnail(recompressed))) <= 4
+
+    other = Image.radial_gradient('L').resize((640, 480)).convert('RGB')
+    assert hamming_distance(image_hash, dhash(thumbnail(other))) > 10
+
+    # Same outline, different content: the hash alone cannot tell these
+    # apart, so the lookup has to reject them on the thumbnail check
+    index = cached_index(image, max_distance=8)
+    textured = make_leaf_image()
+    draw = ImageDraw.Draw(textured)
+    for x in range(180, 480, 40):
+        draw.line((x, 120, x + 60, 360), fill=(150, 170, 60), width=6)
+    for different in (textured, make_leaf_image(lesions=10)):
+        assert hamming_distance(image_hash, dhash(thumbnail(different))) <= 8
+        assert lookup_image(index, different) is None
+    assert lookup_image(index, recompressed) == 'cached'
+    print("✓ dhash near-duplicates")
+
+
+def test_recompressed_copies_match():
+    """Resized and recompressed re-uploads reuse the cached prediction"""
+    index = cached_index(make_leaf_image())
+    for size, quality in [((640, 480), 90), ((1280, 960), 80), ((800, 600), 70),
+                          ((480, 360), 60), ((320, 240), 40)]:
+        assert lookup_image(index, recompress(make_leaf_image(), size, quality)) == 'cached'
+    print("✓ recompressed copies match")
+
+
+def test_lesions_do_not_match_healthy_leaf():
+    """The same leaf with lesions never reuses the healthy prediction"""
+    healthy = make_leaf_image()
+    index = cached_index(healthy, result='healthy')
+    for lesions in (5, 10, 20, 40):
+        for seed in range(3):
+            diseased = make_leaf_image(lesions=lesions, seed=seed)
+            assert lookup_image(index, diseased) is None
+            assert lookup_image(index, recompress(diseased, (800, 600), 70)) is None
+            assert thumbnail_difference(thumbnail(healthy), thumbnail(diseased)) > 10
+    print("✓ lesions do not match healthy leaf")
+
+
+def test_solid_colours_do_not_collide():
+    """Plain images all hash to 0 but only an identical colour matches"""
+    green = Image.new('RGB', (9, 8), (60, 140, 50))
+    index = cached_index(green, result='green')
+    for size in ((1, 1), (9, 8), (5000, 10)):
+        assert dhash(thumbnail(Image.new('RGB', size, (120, 80, 40)))) == 0
+        assert lookup_image(index, Image.new('RGB', size, (120, 80, 40))) is None
+        assert lookup_image(index, Image.new('RGB', size, (60, 140, 50))) == 'green'
+    print("✓ solid colours do not collide")
+
+
+def test_band_split():
+    """Bands cover every bit exactly once"""
+    for max_distance in (0, 1, 4, 7, 63):
+        index = PerceptualHashIndex(max_distance=max_distance)
+        assert len(index._bands) == max_distance + 1
+        covered = 0
+        for shift, mask in index._bands:
+            assert covered & (mask << shift) == 0
+            covered |= mask << shift
+        assert covered == (1 << HASH_BITS) - 1
+    print("✓ band split")
+
+
+def test_lookup_matches_brute_force():
+    """Index lookup agrees with a linear scan for distances around max_distance"""
+    rng = random.Random(0)
+    for max_distance in (0, 2, 4, 9):
+        index = PerceptualHashIndex(max_entries=500, max_distance=max_distance)
+        stored = [rng.getrandbits(HASH_BITS) for _ in range(200)]
+        for i, value in enumerate(stored):
+            index.add('CNN', value, BLANK, i)
+
+        for _ in range(300):
+            query = flip_bits(rng.choice(stored), rng.randint(0, max_distance + 3), rng)
+            distances = [hamming_distance(query, value) for value in stored]
+            nearest = min(distances)
+            result = index.lookup('CNN', query, BLANK)
+            if nearest <= max_distance:
+                assert result is not None
+                assert distances[result] == nearest
+            else:
+                assert result is None
+    print("✓ lookup matches brute force")
+
+
+def test_models_are_separate():
+    """A result stored for one model is never returned for another"""
+    index = PerceptualHashIndex(max_distance=4)
+    index.add('CNN', 12345, BLANK, 'cnn result')
+    assert index.lookup('CNN', 12345 ^ 0b11, BLANK) == 'cnn result'
+    assert index.lookup('ViT', 12345, BLANK) is None
+    print("✓ models are separate")
+
+
+def test_lru_eviction():
+    """Eviction drops the least recently used entry and its buckets"""
+    rng = random.Random(1)
+    index = PerceptualHashIndex(max_entries=3, max_distance=4)
+    first, second, third, fourth = (rng.getrandbits(HASH_BITS) for _ in range(4))
+    index.add('CNN', first, BLANK, 1)
+    index.add('CNN', second, BLANK, 2)
+    index.add('CNN', third, BLANK, 3)
+    assert index.lookup('CNN', first, BLANK) == 1  # first is now most recently used
+
+    index.add('CNN', fourth, BLANK, 4)
+    assert index.lookup('CNN', second, BLANK) is None
+    assert index.lookup('CNN', first, BLANK) == 1
+    assert len(index._entries) == 3
+
+    expected_buckets = set()
+    for value in (first, third, fourth):
+        expected_buckets.update(index._band_keys('CNN', value))
+    assert set(index._buckets) == expected_buckets
+    assert all(second not in bucket for bucket in index._buckets.values())
+    print("✓ LRU eviction")
+
+
+def test_disabled_cache():
+    """max_entries=0 stores nothing and counts nothing"""
+    index = PerceptualHashIndex(max_entries=0)
+    assert not index.enabled
+    index.add('CNN', 42, BLANK, 'result')
+    assert index.lookup('CNN', 42, BLANK) is None
+    stats = index.stats()
+    assert stats['enabled'] is False
+    assert stats['entries'] == stats['hits'] == stats['misses'] == 0
+    print("✓ disabled cache")
+
+
+def test_invalid_settings():
+    """max_distance outside [0, HASH_BITS) and pixel differences outside 0-255 are rejected"""
+    for kwargs in ({'max_distance': -1}, {'max_distance': HASH_BITS},
+                   {'max_pixel_difference': -1}, {'max_pixel_difference': 256}):
+        try:
+            PerceptualHashIndex(**kwargs)
+        except ValueError:
+            continue
+        raise AssertionError(f"{kwargs} was accepted")
+    print("✓ invalid settings")
+
+
+if __name__ == "__main__":
+    test_dhash_near_duplicates()
+    test_recompressed_copies_match()
+    test_lesions_do_not_match_healthy_leaf()
+    test_solid_colours_do_not_collide()
+    test_band_split()
+    test_lookup_matches_brute_force()
+    test_models_are_separate()
+    test_lru_eviction()
+    test_disabled_cache()
+    test_invalid_settings()
+    print("\nAll image cache tests passed")
@@ -0,0 +1,143 @@
+"""
+Self-checking tests for how the API uses the prediction cache
+Run with: python test_main.py
+"""
+import io
+import os
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+import main
+from image_cache import PerceptualHashIndex
+from test_image_cache import make_leaf_image
+
+client = TestClient(main.app)  # no startup event, so no real models are loaded
+
+
+def png_bytes(image):
+    """Encode a PIL image as PNG upload bytes"""
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def post_image(image, model_name):
+    """POST an image to /predict"""
+    return client.post(
+        "/predict",
+        files={"file": ("leaf.png", png_bytes(image), "image/png")},
+        data={"model_name": model_name}
+    )
+
+
+def stubbed_api(cache):
+    """Patch models, inference and the cache with stubs; returns the patchers and mocks"""
+    mocks = {
+        'predict_classification': MagicMock(return_value=('Tomato___healthy', '99.00%')),
+        'predict_segmentation': MagicMock(return_value=('bWFzaw==', '12.50')),
+        'preprocess_cnn': MagicMock(),
+        'preprocess_unet': MagicMock(),
+        'dhash': MagicMock(wraps=main.dhash)
+    }
+    patchers = [patch.dict(main.models, {'CNN': object(), 'U-Net': object()}, clear=True),
+                patch.object(main, 'prediction_cache', cache)]
+    patchers += [patch.object(main, name, mock) for name, mock in mocks.items()]
+    return patchers, mocks
+
+
+def run_with_stubs(cache, body):
+    """Run body(mocks) with the API stubbed out and cache installed"""
+    patchers, mocks = stubbed_api(cache)
+    for patcher in patchers:
+        patcher.start()
+    try:
+        body(mocks)
+    finally:
+        for patcher in reversed(patchers):
+            patcher.stop()
+
+
+def test_cache_settings_fall_back_individually():
+    """An invalid setting falls back to its own default without touching the others"""
+    env = {
+        'PHASH_CACHE_SIZE': '0',
+        'PHASH_MAX_DISTANCE': '64',
+        'PHASH_MAX_PIXEL_DIFFERENCE': 'abc'
+    }
+    with patch.dict(os.environ, env):
+        cache = main.create_prediction_cache()
+    assert cache.max_entries == 0
+    assert not cache.enabled
+    assert cache.max_distance == main.PHASH_MAX_DISTANCE
+    assert cache.max_pixel_difference == main.PHASH_MAX_PIXEL_DIFFERENCE
+
+    env = {'PHASH_CACHE_SIZE': '-5', 'PHASH_MAX_DISTANCE': '8'}
+    with patch.dict(os.environ, env):
+        cache = main.create_prediction_cache()
+    assert cache.max_entries == main.PHASH_CACHE_SIZE
+    assert cache.max_distance == 8
+    print("✓ cache settings fall back individually")
+
+
+def test_cache_hit_skips_inference():
+    """A repeat upload is answered from the cache without running the model"""
+    cache = PerceptualHashIndex()
+
+    def body(mocks):
+        first = post_image(make_leaf_image(), 'CNN')
+        second = post_image(make_leaf_image(), 'CNN')
+        assert first.status_code == second.status_code == 200
+        assert first.json() == second.json()
+        assert mocks['predict_classification'].call_count == 1
+
+        # Same outline with lesions must run the model again
+        assert post_image(make_leaf_image(lesions=10), 'CNN').status_code == 200
+        assert mocks['predict_classification'].call_count == 2
+
+    run_with_stubs(cache, body)
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 2
+    print("✓ cache hit skips inference")
+
+
+def test_unet_bypasses_cache():
+    """U-Net requests never hash, look up or store"""
+    cache = PerceptualHashIndex()
+    cache.lookup = MagicMock(wraps=cache.lookup)
+    cache.add = MagicMock(wraps=cache.add)
+
+    def body(mocks):
+        for _ in range(2):
+            response = post_image(make_leaf_image(), 'U-Net')
+            assert response.status_code == 200
+            assert response.json()['type'] == 'segmentation'
+        assert mocks['predict_segmentation'].call_count == 2
+        mocks['dhash'].assert_not_called()
+
+    run_with_stubs(cache, body)
+    cache.lookup.assert_not_called()
+    cache.add.assert_not_called()
+    assert cache.stats()['entries'] == 0
+    print("✓ U-Net bypasses cache")
+
+
+def test_disabled_cache_skips_hashing():
+    """With PHASH_CACHE_SIZE=0 every request runs the model and nothing is hashed"""
+    cache = PerceptualHashIndex(max_entries=0)
+
+    def body(mocks):
+        for _ in range(2):
+            assert post_image(make_leaf_image(), 'CNN').status_code == 200
+        assert mocks['predict_classification'].call_count == 2
+        mocks['dhash'].assert_not_called()
+
+    run_with_stubs(cache, body)
+    assert cache.stats()['misses'] == 0
+    print("✓ disabled cache skips hashing")
+
+
+if __name__ == "__main__":
+    test_cache_settings_fall_back_individually()
+    test_cache_hit_skips_inference()
+    test_unet_bypasses_cache()
+    test_disabled_cache_skips_hashing()
+    print("\nAll API cache tests passed")